@@ -4,17 +4,27 @@ Author: Owen Sharpe
 Description: Extracting relevant bio-ontologies from the NIH database research project abstracts using Gilda (Gyori Lab)
 """
 
-# import libraries
+# import libraries (gilda and nltk are slow to import, so they are imported in the stages that use them)
+import time
 import pandas as pd
 import json
 import numpy as np
 from tqdm import tqdm
-import nltk
-import gilda
 import argparse
 from pathlib import Path
 import logging
 import zipfile
+import pickle
+import re
+import sys
+from functools import lru_cache
+
+script_start = time.perf_counter()
+
+
+# word pairs the treebank tokenizer splits without a space or punctuation between them (e.g., "cannot", "gonna")
+treebank_splits = [("can", "not"), ("gim", "me"), ("gon", "na"), ("got", "ta"), ("lem", "me"), ("wan", "na"),
+                   ("'t", "is"), ("'t", "was")]
 
 
 def parse_args():
@@ -23,9 +33,237 @@ def parse_args():
                         help="Directory containing the NIH zip files")
     parser.add_argument("--output_file", default="temp_data_storage/annotations.jsonl",
                         help="Path to save annotated output file")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Skip sentences that cannot match any Gilda term before calling Gilda")
+    parser.add_argument("--prefilter_cache", default="temp_data_storage/gilda_prefilter.pkl",
+                        help="Path to cache the compiled prefilter automaton")
+    parser.add_argument("--benchmark", type=int, default=0,
+                        help="Compare plain and prefiltered annotation on the first N projects, then exit")
+    parser.add_argument("--fast_start", action="store_true",
+                        help="Load the Gilda grounder from a pickled snapshot (created on first use)")
+    parser.add_argument("--grounder_snapshot", default="temp_data_storage/gilda_grounder.pkl",
+                        help="Path to the pickled Gilda grounder snapshot")
     return parser.parse_args()
 
 
+def ensure_nltk_data(resource, package):
+    """Download an NLTK package only if the resource cannot be found locally."""
+    import nltk
+
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        nltk.download(package)
+
+
+def load_grounder(snapshot_path=None):
+    """
+    explanation: loads the Gilda grounder, from a pickled snapshot if given (the snapshot is created on first use)
+    :param snapshot_path: path of the pickled grounder, if None the grounder is built by Gilda as usual
+    :return: the Gilda grounder
+    """
+    import gilda
+
+    if snapshot_path is None:
+        return gilda.get_grounder()
+
+    snapshot_path = Path(snapshot_path)
+    if snapshot_path.exists():
+        with snapshot_path.open("rb") as file:
+            snapshot = pickle.load(file)
+        if snapshot["gilda_version"] == gilda.__version__:
+            return snapshot["grounder"]
+
+    # load the disambiguation models now so the snapshot holds them instead of every run loading them lazily
+    print("Creating Gilda grounder snapshot...")
+    grounder = gilda.get_grounder()
+    load_disambiguation_models(grounder)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    with snapshot_path.open("wb") as file:
+        pickle.dump({"gilda_version": gilda.__version__, "grounder": grounder}, file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    return grounder
+
+
+def load_prefilter(cache_path, grounder):
+    """
+    explanation: loads (or builds and caches) an Aho-Corasick automaton of every word that can start a Gilda match
+    :param cache_path: path of the pickled automaton
+    :param grounder: the Gilda grounder
+    :return: the compiled automaton
+    """
+    import ahocorasick
+    import gilda
+    from gilda.ner import core_stop_words, stop_words
+
+    cache_path = Path(cache_path)
+    if cache_path.exists():
+        with cache_path.open("rb") as file:
+            cached = pickle.load(file)
+        if cached["gilda_version"] == gilda.__version__:
+            return cached["automaton"]
+
+    print("Building Gilda prefilter automaton...")
+    automaton = ahocorasick.Automaton()
+    for word, spans in grounder.prefix_index.items():
+        # gilda.annotate never starts a match on these words
+        if word in core_stop_words or (spans == {1} and word in stop_words):
+            continue
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with cache_path.open("wb") as file:
+        pickle.dump({"gilda_version": gilda.__version__, "automaton": automaton}, file)
+    return automaton
+
+
+@lru_cache(maxsize=None)
+def get_dash_pattern():
+    """Regex matching the dashes gilda removes when normalizing, a removed dash can also be a word boundary."""
+    from gilda.process import dashes
+
+    return re.compile('[' + ''.join(re.escape(dash) for dash in dashes) + ']')
+
+
+def has_candidate(automaton, sentence):
+    """
+    explanation: checks if any word gilda.annotate could look up in this sentence is a prefix word of a Gilda term
+    :param automaton: prefilter automaton from load_prefilter
+    :param sentence: raw sentence text
+    :return: False only if Gilda cannot annotate anything in the sentence
+    """
+    from gilda.process import normalize
+
+    # normalize the same way Gilda normalizes each word, keeping track of where dashes were removed
+    pieces = [normalize(piece) for piece in get_dash_pattern().split(sentence)]
+    text = ''.join(pieces)
+    breaks = set()
+    position = 0
+    for piece in pieces[:-1]:
+        position += len(piece)
+        breaks.add(position)
+
+    def is_break(pos):
+        if pos == 0 or pos == len(text) or pos in breaks:
+            return True
+        if not (text[pos - 1].isalnum() and text[pos].isalnum()):
+            return True
+        if text.startswith("n't", pos):
+            return True
+        return any(pos >= len(left) and text.startswith(left, pos - len(left)) and text.startswith(right, pos)
+                   for left, right in treebank_splits)
+
+    for end_idx, word in automaton.iter(text):
+        if is_break(end_idx + 1 - len(word)) and is_break(end_idx + 1):
+            return True
+    return False
+
+
+def annotate_text(text, grounder, automaton=None, sent_tokenizer=None, stats=None):
+    """
+    explanation: gilda.annotate, only handing Gilda the sentences that pass the prefilter (results are identical)
+    :param text: text to annotate
+    :param grounder: the Gilda grounder
+    :param automaton: prefilter automaton, if None the whole text goes straight to Gilda
+    :param sent_tokenizer: sentence tokenizer (the same one Gilda uses by default)
+    :param stats: optional dictionary counting the sentences seen and kept
+    :return: list of Gilda annotations
+    """
+    from gilda.ner import annotate
+
+    if automaton is None:
+        return annotate(text, grounder=grounder)
+
+    sentence_coords = list(sent_tokenizer.span_tokenize(text))
+    candidate_coords = [(start, end) for start, end in sentence_coords
+                        if has_candidate(automaton, text[start:end])]
+    if stats is not None:
+        stats["sentences"] += len(sentence_coords)
+        stats["kept_sentences"] += len(candidate_coords)
+    if not candidate_coords:
+        return []
+    return annotate(text, grounder=grounder, sent_split_fun=lambda _: candidate_coords)
+
+
+def annotate_project(row, grounder, automaton=None, sent_tokenizer=None, stats=None):
+    """Annotate the title and abstract of a single project row."""
+    abstract_text = row['ABSTRACT_TEXT']
+    if pd.isna(abstract_text) or not abstract_text.strip() or len(abstract_text) < 10:
+        abstract_annotations_dict = []
+    else:
+        abstract_annotations = annotate_text(abstract_text, grounder, automaton, sent_tokenizer, stats)
+        abstract_annotations_dict = [ann.to_json() for ann in abstract_annotations]
+
+    title_annotations = annotate_text(row['PROJECT_TITLE'], grounder, automaton, sent_tokenizer, stats)
+    title_annotations_dict = [ann.to_json() for ann in title_annotations]
+
+    return {
+        "application_id": row["APPLICATION_ID"],
+        "abstract_annotations": abstract_annotations_dict,
+        "title_annotations": title_annotations_dict
+    }
+
+
+def load_disambiguation_models(grounder):
+    """Load the Gilda and Adeft disambiguation models that Gilda otherwise loads lazily during annotation."""
+    from gilda.grounder import load_adeft_models
+
+    grounder.get_models()
+    try:
+        grounder.adeft_disambiguators = load_adeft_models()
+    except Exception as e:
+        print(f"Could not preload Adeft models ({e}), they will be loaded on first use")
+
+
+def run_benchmark(proj_data, grounder, automaton, sent_tokenizer):
+    """
+    explanation: annotates the given projects with and without the prefilter, checks the results match and reports
+    timing. Disambiguation models are loaded first and the modes run twice in alternating order (plain, prefilter,
+    prefilter, plain) so one-time loading and caching do not favour either mode.
+    :param proj_data: dataframe of projects to annotate
+    :param grounder: the Gilda grounder
+    :param automaton: prefilter automaton from load_prefilter
+    :param sent_tokenizer: sentence tokenizer for the prefilter
+    :return: True if both modes produced identical annotations
+    """
+    print("Loading disambiguation models before timing...")
+    load_disambiguation_models(grounder)
+    for _, row in proj_data.head(10).iterrows():
+        annotate_project(row, grounder)
+        annotate_project(row, grounder, automaton, sent_tokenizer)
+
+    stats = {"sentences": 0, "kept_sentences": 0}
+    times = {"plain": 0.0, "prefilter": 0.0}
+    results = {}
+    for mode in ["plain", "prefilter", "prefilter", "plain"]:
+        start_time = time.perf_counter()
+        if mode == "plain":
+            records = [annotate_project(row, grounder)
+                       for _, row in tqdm(proj_data.iterrows(), total=len(proj_data),
+                                          desc="Annotating without prefilter")]
+        else:
+            # only count sentences on the first prefilter pass
+            pass_stats = stats if mode not in results else None
+            records = [annotate_project(row, grounder, automaton, sent_tokenizer, pass_stats)
+                       for _, row in tqdm(proj_data.iterrows(), total=len(proj_data),
+                                          desc="Annotating with prefilter")]
+        times[mode] += (time.perf_counter() - start_time) / 2
+        results.setdefault(mode, records)
+
+    def count(records):
+        return sum(len(r["abstract_annotations"]) + len(r["title_annotations"]) for r in records)
+
+    identical = [json.dumps(r) for r in results["plain"]] == [json.dumps(r) for r in results["prefilter"]]
+    print(f"Projects: {len(proj_data)}")
+    print(f"Annotations without prefilter: {count(results['plain'])}, "
+          f"with prefilter: {count(results['prefilter'])}, identical: {identical}")
+    print(f"Sentences passed to Gilda: {stats['kept_sentences']}/{stats['sentences']}")
+    print(f"Mean time without prefilter: {times['plain']:.2f}s, with prefilter: {times['prefilter']:.2f}s, "
+          f"speedup: {times['plain'] / times['prefilter']:.2f}x")
+    return identical
+
+
 def main():
     logging.getLogger('gilda').setLevel(logging.WARNING)
     args = parse_args()
@@ -34,8 +272,22 @@ def main():
     output_path = Path(args.output_file)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # download nltk stopwords
-    nltk.download('stopwords')
+    # make sure nltk stopwords are available (only downloads if they are missing locally)
+    ensure_nltk_data('corpora/stopwords', 'stopwords')
+
+    # load the gilda grounder (from the snapshot in fast start mode)
+    print("Loading Gilda Grounder...")
+    grounder_start = time.perf_counter()
+    grounder = load_grounder(args.grounder_snapshot if args.fast_start else None)
+    grounder_time = time.perf_counter() - grounder_start
+
+    # optional prefilter to skip sentences with no possible Gilda matches
+    automaton, sent_tokenizer = None, None
+    if args.prefilter or args.benchmark:
+        from nltk.tokenize import PunktSentenceTokenizer
+        automaton = load_prefilter(args.prefilter_cache, grounder)
+        sent_tokenizer = PunktSentenceTokenizer()
+    print(f"Startup time: {time.perf_counter() - script_start:.2f}s (Gilda grounder loaded in {grounder_time:.2f}s)")
 
     # initialize data collectors
     project_list, publication_list, abstract_list = [], [], []
@@ -94,27 +346,22 @@ def main():
         how='left'
     )
 
+    if args.benchmark:
+        print("Benchmarking Gilda Prefilter...")
+        identical = run_benchmark(proj_data.head(args.benchmark), grounder, automaton, sent_tokenizer)
+        return 0 if identical else 1
+
     print("Creating Annotations File...")
+    stats = {"sentences": 0, "kept_sentences": 0}
     with output_path.open("w", encoding="utf-8") as outfile:
         for _, row in tqdm(proj_data.iterrows(), total=len(proj_data), desc="Annotating projects"):
-
-            abstract_text = row['ABSTRACT_TEXT']
-            if pd.isna(abstract_text) or not abstract_text.strip() or len(abstract_text) < 10:
-                abstract_annotations_dict = []
-            else:
-                abstract_annotations = gilda.annotate(abstract_text)
-                abstract_annotations_dict = [ann.to_json() for ann in abstract_annotations]
-
-            title_annotations = gilda.annotate(row['PROJECT_TITLE'])
-            title_annotations_dict = [ann.to_json() for ann in title_annotations]
-
-            temp_project_data = {
-                "application_id": row["APPLICATION_ID"],
-                "abstract_annotations": abstract_annotations_dict,
-                "title_annotations": title_annotations_dict
-            }
+            temp_project_data = annotate_project(row, grounder, automaton, sent_tokenizer, stats)
             outfile.write(json.dumps(temp_project_data) + "\n")
 
+    if automaton is not None:
+        print(f"Prefilter passed {stats['kept_sentences']}/{stats['sentences']} sentences to Gilda.")
+    print(f"Total run time: {time.perf_counter() - script_start:.2f}s")
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -4,22 +4,76 @@ Author: Owen Sharpe
 Description: Creating the node and edge relationships for Neo4j given the proper data.
 """
 
-# import libraries
+# import libraries (bioregistry is slow to load, so it is only imported for CURIEs missing from the cache)
+import time
 import pandas as pd
 import json
 from tqdm import tqdm
-import bioregistry
 import argparse
 from pathlib import Path
+import pickle
+from importlib.metadata import version
+
+script_start = time.perf_counter()
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Process NIH project annotations")
     parser.add_argument("--input_dir", default="temp_data_storage", help="Path to data")
     parser.add_argument("--output_dir", default="prepped_data", help="Directory to save output TSV files")
+    parser.add_argument("--fast_start", action="store_true",
+                        help="Reuse normalized CURIEs from a pickled snapshot instead of loading bioregistry")
+    parser.add_argument("--curie_snapshot", default="temp_data_storage/curie_snapshot.pkl",
+                        help="Path to the pickled normalized CURIE snapshot")
     return parser.parse_args()
 
 
+def load_curie_snapshot(snapshot_path):
+    """
+    explanation: loads previously normalized CURIEs, ignoring snapshots made with a different bioregistry version
+    :param snapshot_path: path of the pickled snapshot
+    :return: dictionary of raw CURIE to normalized CURIE
+    """
+    snapshot_path = Path(snapshot_path)
+    if snapshot_path.exists():
+        with snapshot_path.open("rb") as file:
+            snapshot = pickle.load(file)
+        if snapshot["bioregistry_version"] == version("bioregistry"):
+            return snapshot["curies"]
+    return {}
+
+
+def save_curie_snapshot(snapshot_path, curies):
+    """Save the normalized CURIEs for the next run."""
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    with snapshot_path.open("wb") as file:
+        pickle.dump({"bioregistry_version": version("bioregistry"), "curies": curies}, file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def normalize_curie(curie, curies, stats):
+    """
+    explanation: bioregistry.normalize_curie, remembering each result so bioregistry is only loaded on a cache miss
+    :param curie: raw CURIE from the annotations (e.g., 'mesh:D003920')
+    :param curies: dictionary of raw CURIE to normalized CURIE, updated in place
+    :param stats: dictionary counting cache hits and misses and the bioregistry load time, updated in place
+    :return: the normalized CURIE (None if bioregistry cannot normalize it)
+    """
+    if curie in curies:
+        stats["hits"] += 1
+        return curies[curie]
+
+    stats["misses"] += 1
+    miss_start = time.perf_counter()
+    import bioregistry
+    curies[curie] = bioregistry.normalize_curie(curie)
+    if stats["bioregistry_load"] is None:
+        # the first miss imports bioregistry and loads the registry
+        stats["bioregistry_load"] = time.perf_counter() - miss_start
+    return curies[curie]
+
+
 def main():
     args = parse_args()
 
@@ -27,6 +81,11 @@ def main():
     output_dir = Path(args.output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    # normalized CURIEs from previous runs (fast start mode only)
+    curies = load_curie_snapshot(args.curie_snapshot) if args.fast_start else {}
+    curie_stats = {"hits": 0, "misses": 0, "bioregistry_load": None}
+    print(f"Startup time: {time.perf_counter() - script_start:.2f}s")
+
     # load patent, clinical trial, and publication data
     print("Reading in data from temp_data_storage...")
     patents = pd.read_csv(input_dir / 'patents_data.tsv.gz', sep='\t', compression='gzip')
@@ -230,13 +289,13 @@ def main():
             for curie in top_terms:
                 relationships.append({
                     ":START_ID": f"nihreporter.project:{app_id}",
-                    ":END_ID": bioregistry.normalize_curie(curie),
+                    ":END_ID": normalize_curie(curie, curies, curie_stats),
                     ":TYPE": "has_grounded_term"
                 })
 
     project_nodes = pd.DataFrame(applications).drop_duplicates()
     term_nodes = pd.DataFrame(
-        [{"id:ID": bioregistry.normalize_curie(curie), ":LABEL": "BioEntity", "name": name}
+        [{"id:ID": normalize_curie(curie, curies, curie_stats), ":LABEL": "BioEntity", "name": name}
          for curie, name in terms.items()]
     )
     entity_edges = pd.DataFrame(relationships)
@@ -247,6 +306,15 @@ def main():
     term_nodes.to_csv(output_dir / 'bio_entity_nodes.tsv.gz', sep='\t', index=False, compression="gzip")
     entity_edges.to_csv(output_dir / 'project_entity_edges.tsv.gz', sep='\t', index=False, compression="gzip")
 
+    if args.fast_start:
+        save_curie_snapshot(args.curie_snapshot, curies)
+    print(f"CURIE cache: {curie_stats['hits']} hits, {curie_stats['misses']} misses")
+    if curie_stats["bioregistry_load"] is None:
+        print("Bioregistry was not loaded (every CURIE came from the snapshot)")
+    else:
+        print(f"Bioregistry loaded in {curie_stats['bioregistry_load']:.2f}s (first cache miss)")
+    print(f"Total run time: {time.perf_counter() - script_start:.2f}s")
+
 
 if __name__ == '__main__':
     main()
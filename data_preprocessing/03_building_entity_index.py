@@ -0,0 +1,109 @@
+"""
+File: 03_building_entity_index.py
+Author: Owen Sharpe
+Description: Building a memory-mapped CSR adjacency index from the Neo4j edge files so that entity and project
+neighbor queries can be answered locally without the database (see the 'entity_index' package).
+"""
+
+# import libraries
+import pandas as pd
+import numpy as np
+import json
+import argparse
+from pathlib import Path
+
+
+# node labels are recovered from the CURIE prefix, anything not listed here is a grounded BioEntity
+prefix_labels = {
+    "nihreporter.project": "ResearchProject",
+    "pubmed": "Publication",
+    "clinicaltrials": "ClinicalTrial",
+    "google.patent": "Patent",
+}
+default_label = "BioEntity"
+
+edge_files = ["project_entity_edges.tsv.gz", "patent_trial_publink_project_edges.tsv.gz"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped entity/project adjacency index")
+    parser.add_argument("--input_dir", default="prepped_data", help="Directory containing the edge TSV files")
+    parser.add_argument("--output_dir", default="prepped_data/entity_index",
+                        help="Directory to save the index arrays")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    input_dir = Path(args.input_dir)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # load both edge files, only the endpoints and relationship type are needed
+    print("Reading in edge data...")
+    edges = pd.concat(
+        [pd.read_csv(input_dir / file_name, sep='\t', compression='gzip',
+                     usecols=[':START_ID', ':END_ID', ':TYPE'], dtype=str)
+         for file_name in edge_files],
+        ignore_index=True
+    )
+    edges = edges.dropna().drop_duplicates()
+
+    # sorted id dictionary, python string order (code points) matches the utf-8 byte order used for lookups
+    print("Creating sorted ID dictionary...")
+    num_edges = len(edges)
+    codes, node_ids = pd.factorize(pd.concat([edges[':START_ID'], edges[':END_ID']], ignore_index=True), sort=True)
+    codes = codes.astype(np.int32)
+    start, end = codes[:num_edges], codes[num_edges:]
+    del codes
+
+    # label each node by its prefix
+    label_names = list(prefix_labels.values()) + [default_label]
+    prefixes = node_ids.str.split(':', n=1).str[0]
+    node_labels = np.full(len(node_ids), label_names.index(default_label), dtype=np.uint8)
+    for prefix, label in prefix_labels.items():
+        node_labels[prefixes == prefix] = label_names.index(label)
+
+    # relationship type codes
+    type_codes, type_names = pd.factorize(edges[':TYPE'])
+    type_codes = type_codes.astype(np.uint8)
+    del edges, prefixes
+
+    # store each edge in both directions so projects -> entities and entities -> projects are both a single row
+    print("Creating CSR adjacency arrays...")
+    rows = np.concatenate([start, end])
+    cols = np.concatenate([end, start])
+    types = np.concatenate([type_codes, type_codes])
+    del start, end, type_codes
+
+    # sort by row then column so that each neighbor slice is sorted (needed for fast intersections)
+    order = np.lexsort((cols, rows))
+    indices = cols[order]
+    edge_types = types[order]
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(node_ids)), out=indptr[1:])
+    del rows, cols, types, order
+
+    # save arrays to be loaded with mmap_mode='r'
+    print("Saving index arrays...")
+    np.save(output_dir / 'node_ids.npy', np.array(node_ids.str.encode('utf-8'), dtype=bytes))
+    np.save(output_dir / 'node_labels.npy', node_labels)
+    np.save(output_dir / 'indptr.npy', indptr)
+    np.save(output_dir / 'indices.npy', indices)
+    np.save(output_dir / 'edge_types.npy', edge_types)
+
+    metadata = {
+        "num_nodes": int(len(node_ids)),
+        "num_edges": int(len(indices) // 2),
+        "labels": label_names,
+        "edge_types": [str(name) for name in type_names],
+    }
+    with (output_dir / 'metadata.json').open("w", encoding="utf-8") as outfile:
+        json.dump(metadata, outfile, indent=2)
+
+    print(f"Index built with {metadata['num_nodes']} nodes and {metadata['num_edges']} edges.")
+
+
+if __name__ == '__main__':
+    main()
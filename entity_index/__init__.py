@@ -0,0 +1,151 @@
+"""
+Title: __init__.py
+Author: Owen Sharpe
+Description: query API over the memory-mapped adjacency index built by
+'data_preprocessing/03_building_entity_index.py'. Answers neighbor, two-hop and intersection questions
+(e.g., which projects, publications and trials mention a BioEntity) without a running Neo4j database.
+
+Index layout (all arrays are saved with np.save and opened with mmap_mode='r'):
+
+- node_ids.npy: sorted, utf-8 encoded node IDs (CURIEs), the position of an ID is its node index
+- node_labels.npy: label code of each node (names listed in metadata.json)
+- indptr.npy / indices.npy: CSR adjacency, the neighbors of node i are indices[indptr[i]:indptr[i + 1]]
+  and are sorted. Every edge is stored in both directions.
+- edge_types.npy: relationship type code parallel to indices (names listed in metadata.json)
+"""
+
+import json
+from pathlib import Path
+import numpy as np
+
+
+default_index_dir = Path(__file__).resolve().parent.parent / "data_preprocessing" / "prepped_data" / "entity_index"
+
+
+class EntityIndex:
+    """Read-only neighbor lookups over the memory-mapped entity/project graph."""
+
+    def __init__(self, index_dir=default_index_dir):
+        index_dir = Path(index_dir)
+        with (index_dir / 'metadata.json').open("r", encoding="utf-8") as file:
+            self.metadata = json.load(file)
+
+        self.node_ids = np.load(index_dir / 'node_ids.npy', mmap_mode='r')
+        self.node_labels = np.load(index_dir / 'node_labels.npy', mmap_mode='r')
+        self.indptr = np.load(index_dir / 'indptr.npy', mmap_mode='r')
+        self.indices = np.load(index_dir / 'indices.npy', mmap_mode='r')
+        self.edge_types = np.load(index_dir / 'edge_types.npy', mmap_mode='r')
+
+        self.labels = self.metadata['labels']
+        self.types = self.metadata['edge_types']
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node_id):
+        try:
+            self._lookup(node_id)
+        except KeyError:
+            return False
+        return True
+
+    def _lookup(self, node_id):
+        """
+        explanation: binary search for a node ID in the sorted ID dictionary
+        :param node_id: node ID / CURIE (e.g., 'mesh:D003920' or 'nihreporter.project:10000001')
+        :return: the integer node index
+        """
+        key = node_id.encode('utf-8')
+        idx = int(np.searchsorted(self.node_ids, key))
+        if idx == len(self.node_ids) or self.node_ids[idx] != key:
+            raise KeyError(node_id)
+        return idx
+
+    def _code(self, names, name):
+        """Map a label or relationship type name to its stored code."""
+        try:
+            return names.index(name)
+        except ValueError:
+            raise KeyError(name) from None
+
+    def _neighbor_indices(self, idx, label=None, rel_type=None):
+        """Sorted neighbor node indices of a node index, optionally filtered by neighbor label and edge type."""
+        start, end = self.indptr[idx], self.indptr[idx + 1]
+        neighbors = np.asarray(self.indices[start:end])
+        mask = None
+        if rel_type is not None:
+            mask = np.asarray(self.edge_types[start:end]) == self._code(self.types, rel_type)
+        if label is not None:
+            label_mask = self.node_labels[neighbors] == self._code(self.labels, label)
+            mask = label_mask if mask is None else mask & label_mask
+        if mask is not None:
+            neighbors = neighbors[mask]
+        return neighbors
+
+    def _unique(self, idxs):
+        """Sorted unique node indices (a plain sort is much faster than np.unique for large integer arrays)."""
+        idxs = np.sort(idxs)
+        if len(idxs):
+            idxs = idxs[np.concatenate(([True], idxs[1:] != idxs[:-1]))]
+        return idxs
+
+    def _decode(self, idxs):
+        return [node_id.decode('utf-8') for node_id in self.node_ids[self._unique(idxs)]]
+
+    def label(self, node_id):
+        """Return the label (e.g., 'ResearchProject' or 'BioEntity') of a node."""
+        return self.labels[self.node_labels[self._lookup(node_id)]]
+
+    def degree(self, node_id):
+        """Return the number of edges touching a node."""
+        idx = self._lookup(node_id)
+        return int(self.indptr[idx + 1] - self.indptr[idx])
+
+    def neighbors(self, node_id, label=None, rel_type=None):
+        """
+        explanation: direct neighbors of a node (e.g., the projects that mention a BioEntity)
+        :param node_id: node ID / CURIE
+        :param label: only return neighbors with this label (e.g., 'ResearchProject')
+        :param rel_type: only follow edges of this type (e.g., 'has_grounded_term')
+        :return: sorted list of neighbor IDs
+        """
+        return self._decode(self._neighbor_indices(self._lookup(node_id), label=label, rel_type=rel_type))
+
+    def two_hop(self, node_id, via=None, label=None):
+        """
+        explanation: nodes two edges away (e.g., the publications and trials of the projects mentioning a BioEntity)
+        :param node_id: node ID / CURIE
+        :param via: label of the intermediate nodes (e.g., 'ResearchProject')
+        :param label: only return second hop nodes with this label (e.g., 'Publication')
+        :return: sorted list of node IDs, not including the starting node
+        """
+        idx = self._lookup(node_id)
+        mids = self._neighbor_indices(idx, label=via)
+        if not len(mids):
+            return []
+
+        # gather every intermediate node's neighbor range into one set of positions and slice 'indices' once
+        starts = np.asarray(self.indptr[mids])
+        lengths = np.asarray(self.indptr[mids + 1]) - starts
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        result = np.asarray(self.indices[np.repeat(starts, lengths) + offsets])
+        if label is not None:
+            result = result[self.node_labels[result] == self._code(self.labels, label)]
+        return self._decode(result[result != idx])
+
+    def intersection(self, node_ids, label=None):
+        """
+        explanation: nodes connected to every given node (e.g., the projects that mention all given entities)
+        :param node_ids: iterable of node IDs / CURIEs
+        :param label: only return common neighbors with this label
+        :return: sorted list of node IDs
+        """
+        result = None
+        for node_id in node_ids:
+            neighbors = self._unique(self._neighbor_indices(self._lookup(node_id), label=label))
+            result = neighbors if result is None else np.intersect1d(result, neighbors, assume_unique=True)
+            if not len(result):
+                break
+        if result is None:
+            return []
+        return self._decode(result)
@@ -0,0 +1,67 @@
+"""
+Title: __main__.py
+Author: Owen Sharpe
+Description: command line access to the local entity index
+Can be called with "python -m entity_index neighbors mesh:D003920 --label ResearchProject" in the cli
+"""
+
+import argparse
+import os
+import sys
+import time
+from entity_index import EntityIndex, default_index_dir
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query the local memory-mapped entity/project index")
+    parser.add_argument("--index_dir", default=str(default_index_dir), help="Directory containing the index arrays")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    neighbors = subparsers.add_parser("neighbors", help="Direct neighbors of a node")
+    neighbors.add_argument("node_id", help="Node ID / CURIE")
+    neighbors.add_argument("--label", help="Only return neighbors with this label")
+    neighbors.add_argument("--rel_type", help="Only follow edges of this type")
+
+    two_hop = subparsers.add_parser("two_hop", help="Nodes two edges away from a node")
+    two_hop.add_argument("node_id", help="Node ID / CURIE")
+    two_hop.add_argument("--via", help="Label of the intermediate nodes")
+    two_hop.add_argument("--label", help="Only return nodes with this label")
+
+    intersect = subparsers.add_parser("intersect", help="Nodes connected to every given node")
+    intersect.add_argument("node_ids", nargs="+", help="Node IDs / CURIEs")
+    intersect.add_argument("--label", help="Only return nodes with this label")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = EntityIndex(args.index_dir)
+
+    query_start = time.perf_counter()
+    try:
+        if args.command == "neighbors":
+            results = index.neighbors(args.node_id, label=args.label, rel_type=args.rel_type)
+        elif args.command == "two_hop":
+            results = index.two_hop(args.node_id, via=args.via, label=args.label)
+        else:
+            results = index.intersection(args.node_ids, label=args.label)
+    except KeyError as e:
+        print(f"Error: unknown node, label or relationship type {e}", file=sys.stderr)
+        return 1
+    query_time = time.perf_counter() - query_start
+
+    try:
+        for node_id in results:
+            print(node_id)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # output was piped into something like 'head' that stopped reading
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    print(f"{len(results)} result(s) in {query_time * 1e6:.0f} microseconds", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,128 @@
 #!/bin/bash
 
-set -eoxu pipefail
+set -euo pipefail
+
+# settings (can be overridden with 'docker run -e ...')
+NEO4J_URL="${NEO4J_URL:-bolt://localhost:7687}"
+NEXUS_READY_TIMEOUT="${NEXUS_READY_TIMEOUT:-300}"  # seconds to wait for the database before giving up
+NEXUS_WARMUP="${NEXUS_WARMUP:-apoc}"  # 'apoc', 'labels' or 'none'
+NEXUS_WARMUP_LABELS="${NEXUS_WARMUP_LABELS:-ResearchProject BioEntity}"  # labels to preload in 'labels' mode
+NEXUS_PROBE_QUERY="${NEXUS_PROBE_QUERY:-MATCH (p:ResearchProject)-[:has_grounded_term]->(e:BioEntity) RETURN p.id, e.id LIMIT 25}"
+
+bolt_host_port="${NEO4J_URL#*://}"
+bolt_host="${bolt_host_port%:*}"
+bolt_port="${bolt_host_port##*:}"
+
+now() {
+  date +%s.%N
+}
+
+elapsed() {
+  awk -v start="$1" -v end="$(now)" 'BEGIN { printf "%.2f", end - start }'
+}
+
+# bolt handshake: magic preamble followed by four version proposals (4.4 down to 4.0), the server replies with the
+# chosen version, or 0 if none are supported
+bolt_ready() {
+  local reply
+  reply=$(timeout 1 bash -c "
+    exec 3<>/dev/tcp/${bolt_host}/${bolt_port}
+    printf '\x60\x60\xb0\x17\x00\x04\x04\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00' >&3
+    head -c 4 <&3 | od -An -tx1 | tr -d ' \n'
+  " 2>/dev/null) || return 1
+  [ -n "$reply" ] && [ "$reply" != "00000000" ]
+}
+
+cypher() {
+  cypher-shell -a "$NEO4J_URL" -u neo4j -p neo4j --non-interactive "$@" < /dev/null
+}
+
+# the database can still be recovering right after the handshake, so wait until it answers a query
+query_ready() {
+  cypher "RETURN 1" > /dev/null 2>&1
+}
+
+# retry a check with sub-second backoff until it succeeds, the database exits, or the timeout passes
+wait_for() {
+  local delay=0.05
+  until "$@"
+  do
+    if ! kill -0 "$neo4j_pid" 2>/dev/null; then
+      echo "Database exited before becoming ready"
+      exit 1
+    fi
+    if awk -v start="$start_time" -v now="$(now)" -v limit="$NEXUS_READY_TIMEOUT" 'BEGIN { exit !(now - start > limit) }'; then
+      echo "Database not ready after ${NEXUS_READY_TIMEOUT}s"
+      kill -TERM "$neo4j_pid" || true
+      exit 1
+    fi
+    sleep "$delay"
+    delay=$(awk -v d="$delay" 'BEGIN { d *= 2; print (d > 0.5 ? 0.5 : d) }')
+  done
+}
+
+# forward container stop signals to neo4j
+shutdown() {
+  echo "Stopping database"
+  kill -TERM "$neo4j_pid" 2>/dev/null || true
+  wait "$neo4j_pid" || true
+  exit 0
+}
 
 echo "Starting database"
-neo4j start
+start_time=$(now)
+neo4j console &
+neo4j_pid=$!
+trap shutdown TERM INT
 
 echo "Waiting for database"
-until [ \
-  "$(curl -s -w '%{http_code}' -o /dev/null "http://localhost:7474")" \
-  -eq 200 ]
-do
-  sleep 5
-done
-
-neo4j status
-sleep 1000
+wait_for bolt_ready
+bolt_time=$(elapsed "$start_time")
+echo "Bolt handshake succeeded after ${bolt_time}s"
+wait_for query_ready
+query_time=$(elapsed "$start_time")
+echo "Database answering queries after ${query_time}s"
+
+# warm the page cache before reporting ready
+warmup_start=$(now)
+warmup_status="completed"
+case "$NEXUS_WARMUP" in
+  apoc)
+    echo "Warming page cache with apoc.warmup.run"
+    cypher "CALL apoc.warmup.run(true, true, true)" || warmup_status="failed"
+    ;;
+  labels)
+    for label in $NEXUS_WARMUP_LABELS
+    do
+      echo "Preloading ${label} nodes and relationships"
+      cypher "MATCH (n:\`${label}\`) OPTIONAL MATCH (n)-[r]-() RETURN count(n.id) AS nodes, count(r) AS relationships" \
+        || warmup_status="failed"
+    done
+    ;;
+  none)
+    echo "Skipping page cache warm-up"
+    warmup_status="skipped"
+    ;;
+  *)
+    echo "Unknown NEXUS_WARMUP '${NEXUS_WARMUP}' (expected 'apoc', 'labels' or 'none')"
+    kill -TERM "$neo4j_pid" || true
+    exit 1
+    ;;
+esac
+warmup_time=$(elapsed "$warmup_start")
+
+# first query latency as seen by a client after warm-up
+probe_start=$(now)
+(cypher --format verbose "$NEXUS_PROBE_QUERY" | tail -n 1) || echo "Probe query failed"
+probe_time=$(elapsed "$probe_start")
+
+case "$warmup_status" in
+  completed) warmup_summary="warm-up ${warmup_time}s" ;;
+  skipped) warmup_summary="warm-up skipped, page cache is cold" ;;
+  failed) warmup_summary="warm-up FAILED after ${warmup_time}s, page cache may be cold" ;;
+esac
+echo "Database ready in $(elapsed "$start_time")s (bolt ${bolt_time}s, queries ${query_time}s, ${warmup_summary})"
+echo "First query latency: ${probe_time}s (including cypher-shell startup)"
+
+# keep the container in the foreground for as long as neo4j runs
+wait "$neo4j_pid"